@@ -9,6 +9,11 @@ subset of the Playwright API exercised by the tests.
 
 Only the synchronous API is implemented at the moment; the real project
 code does not depend on Playwright at runtime.
+
+:mod:`playwright.image_fallback` and :mod:`playwright.speech` hold
+Python references of the reply handling in ``app.js`` so its per-turn
+cost can be benchmarked alongside the simulated UI;
+:mod:`playwright.replay` chains them into ``python -m playwright replay``.
 """
 
 from .sync_api import sync_playwright  # noqa: F401
@@ -5,6 +5,10 @@ invoked via ``python -m playwright``.  The GitHub workflow exercises the
 ``install`` command to ensure the necessary browser binaries are
 present.  In this project we ship a very small stub of the library, so
 we emulate the CLI enough for the workflow to succeed.
+
+``replay`` is specific to this stub: it streams recorded transcripts
+through the simulated voice turn and reports per-stage statistics (see
+:mod:`playwright.replay`).
 """
 
 from __future__ import annotations
@@ -22,11 +26,17 @@ def main() -> int:
 
     The workflow only calls ``install`` with optional arguments.  To keep
     behaviour predictable we simply acknowledge the request and exit with
-    a success status code.  Other commands are treated as no-ops so that
-    developers running the stub do not encounter unexpected failures.
+    a success status code.  ``replay`` runs the transcript replay
+    pipeline.  Other commands are treated as no-ops so that developers
+    running the stub do not encounter unexpected failures.
     """
 
     argv = sys.argv[1:]
+    if argv and argv[0] == "replay":
+        from .replay import main as replay_main
+
+        return replay_main(argv[1:])
+
     if argv and argv[0] == "install":
         print(
             "Playwright stub: skipping browser installation for arguments:",
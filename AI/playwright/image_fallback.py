@@ -0,0 +1,503 @@
+"""Reference implementation of the image-fallback stage of ``getAIResponse``.
+
+After every reply the front-end decides whether the assistant already
+returned an image, whether a fallback Pollinations image should be
+requested instead, and which image references to strip from the text
+before it is shown and spoken.  ``app.js`` performs that work with a
+series of independent regex scans and builds fresh ``RegExp`` objects
+from the selected URL on every turn.
+
+This module mirrors the same behaviour in Python so the cost of the
+stage can be measured offline.  Patterns are compiled once, normalised
+fallback prompts are memoised in a bounded LRU cache, and
+:func:`scan_image_references` extracts and removes image references in a
+single pass over the reply.
+
+The port follows the intent of ``app.js`` rather than its accidental
+escaping: the browser builds the markdown removal patterns from template
+strings, which drops the backslashes, so in practice only the raw URL is
+removed there.  Here ``![alt](url)`` and ``[alt](url)`` are removed as
+whole references.  ``getAIResponse`` removes the URL with its query
+string cut off, so a reference also matches when its target is that URL
+followed by a query string; the query string goes with it.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote, urlencode
+
+PROMPT_CACHE_SIZE = 256
+URL_PATTERN_CACHE_SIZE = 64
+
+# Characters ``encodeURIComponent`` leaves untouched besides alphanumerics.
+_URI_COMPONENT_SAFE = "-_.!~*'()"
+
+FALLBACK_IMAGE_KEYWORDS = (
+    "show",
+    "picture",
+    "image",
+    "photo",
+    "illustration",
+    "draw",
+    "paint",
+    "render",
+    "display",
+    "visual",
+    "wallpaper",
+    "generate",
+)
+
+# Compiled patterns ---------------------------------------------------------------
+
+# ``[image]`` and the "here is an image" style cues checked by app.js only
+# ever match text that already contains one of the keywords, so a single
+# alternation is enough to answer the same question.
+_FALLBACK_KEYWORD_PATTERN = re.compile("|".join(re.escape(k) for k in FALLBACK_IMAGE_KEYWORDS))
+
+_EXPLICIT_PROMPT_PATTERN = re.compile(r"(?:image\s+prompt|prompt)\s*[:=]\s*\"?([^\"\n]+)\"?", re.IGNORECASE)
+_PROMPT_FILLER_PATTERNS = (
+    re.compile(r"\b(?:please|kindly)\b", re.IGNORECASE),
+    re.compile(r"\b(?:can|could|would|will|may|might|let's)\b\s+(?:you\s+)?", re.IGNORECASE),
+    re.compile(
+        r"\b(?:show|display|draw|paint|generate|create|make|produce|render|give|find|display)\b\s+(?:me\s+|us\s+)?",
+        re.IGNORECASE,
+    ),
+    re.compile(
+        r"\b(?:an?\s+)?(?:image|picture|photo|visual|illustration|render|drawing|art|shot|wallpaper)\b"
+        r"\s*(?:of|showing)?\s*",
+        re.IGNORECASE,
+    ),
+)
+
+_PROMPT_LEADING_PATTERN = re.compile("^[\"'​\\s]+")
+_PROMPT_TRAILING_PATTERN = re.compile("[\"'​\\s]+$")
+_MULTIPLE_SPACES_PATTERN = re.compile(r"\s{2,}")
+
+_URL_LEADING_PATTERN = re.compile(r"^[\"'<\\\[({]+")
+_URL_TRAILING_BRACKETS_PATTERN = re.compile(r"[\"'>)\]}]+$")
+_URL_TRAILING_PUNCTUATION_PATTERN = re.compile(r"[,.;!]+$")
+
+_MARKDOWN_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\((https?://[^)\s]+)\)", re.IGNORECASE)
+_RAW_URL_PATTERN = re.compile(r"https?://[^)\s]+", re.IGNORECASE)
+
+# One scanner for every image reference shape handled by the stage.  Each
+# match is a markdown image, a markdown link or a bare URL.
+_REFERENCE_PATTERN = re.compile(
+    r"(?P<image>!\[[^\]]*\]\((?P<image_url>https?://[^)\s]+)\))"
+    r"|(?P<link>\[[^\]]*\]\((?P<link_url>https?://[^)\s]+)\))"
+    r"|(?P<raw>https?://[^)\s]+)",
+    re.IGNORECASE,
+)
+
+_IMAGE_LABEL_PATTERNS = (
+    re.compile(r"\bimage\s+url\s*:?", re.IGNORECASE),
+    re.compile(r"\bimage\s+link\s*:?", re.IGNORECASE),
+    re.compile(r"\bart(?:work)?\s+(?:url|link)\s*:?", re.IGNORECASE),
+    re.compile(r"<\s*>"),
+    re.compile(r"\(\s*\)"),
+    re.compile(r"\[\s*\]"),
+)
+_EXCESS_NEWLINES_PATTERN = re.compile(r"\n{3,}")
+_EXCESS_INLINE_SPACES_PATTERN = re.compile(r"[ \t]{2,}")
+_SPACE_BEFORE_PUNCTUATION_PATTERN = re.compile(r"\s+([.,!?;:])")
+
+
+# URL helpers ---------------------------------------------------------------------
+
+
+def sanitize_image_url(raw_url: Any) -> str:
+    """Strip wrapping quotes, brackets and trailing punctuation from a URL."""
+
+    if not isinstance(raw_url, str):
+        return ""
+    url = _URL_LEADING_PATTERN.sub("", raw_url.strip())
+    url = _URL_TRAILING_BRACKETS_PATTERN.sub("", url)
+    return _URL_TRAILING_PUNCTUATION_PATTERN.sub("", url)
+
+
+def cut_image_url(url: str) -> str:
+    """Drop the query string, as ``cutImageUrl`` does before display."""
+
+    if not url:
+        return ""
+    return url.split("?", 1)[0]
+
+
+def extract_image_url(text: Any) -> str:
+    """Return the first markdown image URL, or failing that the first URL."""
+
+    if not isinstance(text, str) or not text.strip():
+        return ""
+    match = _MARKDOWN_IMAGE_PATTERN.search(text) if "![" in text else None
+    if match:
+        return sanitize_image_url(match.group(1))
+    match = _RAW_URL_PATTERN.search(text)
+    if match:
+        return sanitize_image_url(match.group(0))
+    return ""
+
+
+def build_pollinations_image_url(prompt: Any, model: str = "flux", seed: int = 0) -> str:
+    """Build the Pollinations URL used for fallback images.
+
+    The browser picks a random seed; it is a parameter here so results are
+    reproducible.
+    """
+
+    if not isinstance(prompt, str):
+        return ""
+    cleaned = clean_fallback_prompt(prompt)
+    if not cleaned:
+        return ""
+    params = urlencode(
+        {
+            "model": model or "flux",
+            "width": "1024",
+            "height": "1024",
+            "nologo": "true",
+            "enhance": "true",
+            "seed": str(seed),
+        }
+    )
+    return f"https://image.pollinations.ai/prompt/{quote(cleaned, safe=_URI_COMPONENT_SAFE)}?{params}"
+
+
+# Fallback prompts ----------------------------------------------------------------
+
+
+def clean_fallback_prompt(text: str) -> str:
+    """Trim quotes, zero-width spaces and repeated whitespace from a prompt."""
+
+    text = _PROMPT_LEADING_PATTERN.sub("", text)
+    text = _PROMPT_TRAILING_PATTERN.sub("", text)
+    return _MULTIPLE_SPACES_PATTERN.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def normalize_fallback_prompt(text: str) -> str:
+    """Strip request filler from ``text`` and capitalise the remaining prompt.
+
+    Memoised on the text itself: that is usually the user's request,
+    which repeats across turns far more often than the assistant's reply.
+    """
+
+    for pattern in _PROMPT_FILLER_PATTERNS:
+        text = pattern.sub("", text)
+    cleaned = clean_fallback_prompt(text)
+    if not cleaned:
+        return ""
+    return cleaned[0].upper() + cleaned[1:]
+
+
+def build_fallback_image_prompt(user_input: str = "", assistant_message: str = "") -> str:
+    """Derive an image prompt from the reply or the user's request."""
+
+    for source in (assistant_message, user_input):
+        if not source:
+            continue
+        match = _EXPLICIT_PROMPT_PATTERN.search(source)
+        if match and match.group(1):
+            cleaned = clean_fallback_prompt(match.group(1))
+            if cleaned:
+                return cleaned
+
+    candidate = user_input or assistant_message or ""
+    if not candidate:
+        return ""
+    return normalize_fallback_prompt(candidate)
+
+
+def should_request_fallback_image(
+    user_input: str = "",
+    assistant_message: str = "",
+    fallback_prompt: str = "",
+    existing_image_url: str = "",
+) -> bool:
+    """Return ``True`` when the turn asks for an image but none was returned."""
+
+    if existing_image_url or not fallback_prompt:
+        return False
+    combined = f"{user_input} {assistant_message}".lower()
+    return _FALLBACK_KEYWORD_PATTERN.search(combined) is not None
+
+
+# Image reference removal ---------------------------------------------------------
+
+
+# A query string after the removed URL.  Inside markdown it runs to the
+# closing parenthesis; after a bare URL it stops before trailing
+# punctuation, which :func:`sanitize_image_url` would not count as URL.
+_MARKDOWN_QUERY = r"(?:\?[^)\s]*)?"
+_RAW_QUERY = r"(?:\?[^)\s]*[^)\s,.;!\"'>\]}])?"
+
+
+@lru_cache(maxsize=URL_PATTERN_CACHE_SIZE)
+def _url_reference_patterns(url: str) -> Tuple["re.Pattern[str]", ...]:
+    escaped = re.escape(url)
+    return (
+        re.compile(rf"!\[[^\]]*\]\({escaped}{_MARKDOWN_QUERY}\)", re.IGNORECASE),
+        re.compile(rf"\[[^\]]*\]\({escaped}{_MARKDOWN_QUERY}\)", re.IGNORECASE),
+        re.compile(rf"{escaped}{_RAW_QUERY}", re.IGNORECASE),
+    )
+
+
+def _tidy_after_removal(text: str) -> str:
+    for pattern in _IMAGE_LABEL_PATTERNS:
+        text = pattern.sub("", text)
+    text = _EXCESS_NEWLINES_PATTERN.sub("\n\n", text)
+    text = _EXCESS_INLINE_SPACES_PATTERN.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCTUATION_PATTERN.sub(r"\1", text)
+    return text.strip()
+
+
+def remove_image_references(text: Any, image_url: str) -> str:
+    """Remove every reference to ``image_url`` along with its labels."""
+
+    if not isinstance(text, str):
+        return ""
+    url = sanitize_image_url(image_url) if image_url else ""
+    if not url:
+        return text.strip()
+    for pattern in _url_reference_patterns(url):
+        text = pattern.sub("", text)
+    return _tidy_after_removal(text)
+
+
+def _remove_url(text: str, url: str) -> str:
+    return _url_reference_patterns(url)[2].sub("", text)
+
+
+def _strip_references(text: str, matches: Sequence["re.Match[str]"], url: str) -> str:
+    image_pattern, link_pattern, _ = _url_reference_patterns(url)
+    parts: List[str] = []
+    position = 0
+    for match in matches:
+        parts.append(text[position : match.start()])
+        position = match.end()
+        reference = match.group(0)
+        if match.lastgroup == "image" and image_pattern.fullmatch(reference):
+            continue
+        if match.lastgroup == "link" and link_pattern.fullmatch(reference):
+            continue
+        parts.append(_remove_url(reference, url))
+    parts.append(text[position:])
+    return _tidy_after_removal("".join(parts))
+
+
+def _select_url(matches: Sequence["re.Match[str]"]) -> str:
+    for match in matches:
+        if match.lastgroup == "image":
+            return sanitize_image_url(match.group("image_url"))
+    if not matches:
+        return ""
+    first = matches[0]
+    return sanitize_image_url(first.group("link_url") if first.lastgroup == "link" else first.group(0))
+
+
+@dataclass
+class ImageReferenceScan:
+    """Result of :func:`scan_image_references`."""
+
+    url: str
+    text: str
+
+
+def scan_image_references(
+    text: Any, image_url: Optional[str] = None, strip_query: bool = False
+) -> ImageReferenceScan:
+    """Find the reply's image URL and remove its references in one pass.
+
+    This is equivalent to :func:`extract_image_url` followed by
+    :func:`remove_image_references` for whitespace-separated references.
+    When ``image_url`` is given it is removed instead of the discovered URL.
+    ``strip_query`` applies :func:`cut_image_url` to the discovered URL, as
+    ``getAIResponse`` does.
+    """
+
+    if not isinstance(text, str):
+        return ImageReferenceScan("", "")
+    matches = list(_REFERENCE_PATTERN.finditer(text))
+    if image_url is None:
+        url = _select_url(matches)
+        if strip_query:
+            url = cut_image_url(url)
+    else:
+        url = sanitize_image_url(image_url)
+    if not url:
+        return ImageReferenceScan("", text if image_url is None else text.strip())
+    return ImageReferenceScan(url, _strip_references(text, matches, url))
+
+
+# Whole stage ---------------------------------------------------------------------
+
+
+@dataclass
+class ImageStageResult:
+    """Outcome of the image-fallback stage for a single reply."""
+
+    text: str
+    image_url: str
+    fallback_prompt: str
+    used_fallback: bool
+
+
+def process_reply(
+    user_input: str,
+    assistant_message: str,
+    raw_text: Optional[str] = None,
+    model: str = "flux",
+    seed: int = 0,
+) -> ImageStageResult:
+    """Run the image-fallback stage exactly as ``getAIResponse`` orders it.
+
+    ``raw_text`` is the model output before directives were stripped; the
+    browser looks for an image URL there first.
+    """
+
+    response_url = ""
+    if raw_text is not None and raw_text != assistant_message:
+        response_url = cut_image_url(extract_image_url(raw_text))
+
+    if response_url:
+        scan = scan_image_references(assistant_message, image_url=response_url)
+    else:
+        scan = scan_image_references(assistant_message, strip_query=True)
+
+    fallback_prompt = build_fallback_image_prompt(user_input, assistant_message)
+    if scan.url:
+        text = scan.text
+        image_url = scan.url
+        used_fallback = False
+    else:
+        image_url = ""
+        if should_request_fallback_image(user_input, assistant_message, fallback_prompt, ""):
+            image_url = build_pollinations_image_url(fallback_prompt, model=model, seed=seed)
+        used_fallback = bool(image_url)
+        text = remove_image_references(assistant_message, image_url) if image_url else assistant_message
+
+    return ImageStageResult(
+        text=_EXCESS_NEWLINES_PATTERN.sub("\n\n", text).strip(),
+        image_url=image_url,
+        fallback_prompt=fallback_prompt,
+        used_fallback=used_fallback,
+    )
+
+
+# Benchmark -----------------------------------------------------------------------
+
+SAMPLE_REPLIES: Tuple[Tuple[str, str], ...] = (
+    ("Show me a picture of a neon city", "Here is your city.\n![neon city](https://image.pollinations.ai/prompt/neon%20city)"),
+    ("Can you draw a cat wearing a hat?", "Sure thing, a dapper cat coming right up."),
+    ("What's the weather like on Mars?", "Cold, dusty and thin on air. Bring a jacket."),
+    ("Generate a wallpaper of a forest", "Image prompt: \"misty pine forest at dawn\""),
+    ("Tell me a joke", "Why did the robot cross the road? It was programmed to."),
+    (
+        "Give me the link again",
+        "Image URL: https://image.pollinations.ai/prompt/forest?seed=42 enjoy it.",
+    ),
+    ("Paint a sunset over the ocean please", "A warm sunset, coming up. [view](https://example.com/sunset.png)"),
+    ("How are you today?", "Doing great, thanks for asking!"),
+)
+
+
+def _time_pass(replies: Sequence[Tuple[str, str]]) -> float:
+    start = time.perf_counter()
+    for user_input, assistant_message in replies:
+        process_reply(user_input, assistant_message)
+    return time.perf_counter() - start
+
+
+def _rates(prefix: str, seconds: float, processed: int) -> Dict[str, float]:
+    return {
+        f"{prefix}_seconds": seconds,
+        f"{prefix}_replies_per_second": processed / seconds if seconds else float("inf"),
+        f"{prefix}_microseconds_per_reply": seconds / processed * 1_000_000,
+    }
+
+
+def benchmark(corpus: Iterable[Tuple[str, str]] = SAMPLE_REPLIES, repeat: int = 1) -> Dict[str, Any]:
+    """Measure throughput of :func:`process_reply` over ``corpus``.
+
+    The first pass runs with empty caches and is reported as ``cold``; it
+    is the per-turn cost for traffic like the corpus.  Further passes up to
+    ``repeat`` are reported as ``warm`` and show the best case once every
+    prompt and URL pattern is cached.
+    """
+
+    replies = list(corpus)
+    if not replies or repeat < 1:
+        raise ValueError("benchmark needs a non-empty corpus and repeat >= 1")
+
+    normalize_fallback_prompt.cache_clear()
+    _url_reference_patterns.cache_clear()
+    stats: Dict[str, Any] = {"replies": len(replies), "passes": repeat}
+    stats.update(_rates("cold", _time_pass(replies), len(replies)))
+    cache = normalize_fallback_prompt.cache_info()
+    stats["cold_prompt_cache_hits"] = cache.hits
+    stats["cold_prompt_cache_misses"] = cache.misses
+
+    if repeat > 1:
+        warm_seconds = sum(_time_pass(replies) for _ in range(repeat - 1))
+        stats.update(_rates("warm", warm_seconds, len(replies) * (repeat - 1)))
+    return stats
+
+
+SAMPLE_REPEAT = 200
+
+
+def _load_corpus(path: str) -> List[Tuple[str, str]]:
+    corpus: List[Tuple[str, str]] = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            corpus.append((str(record.get("user", "")), str(record.get("assistant", ""))))
+    return corpus
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Benchmark the stage over a JSON Lines corpus or the built-in sample.
+
+    Each line holds an object with ``user`` and ``assistant`` keys.  A
+    corpus file is processed once; the small built-in sample is repeated
+    so the warm figures are measurable.
+    """
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv:
+        stats = benchmark(_load_corpus(argv[0]))
+    else:
+        stats = benchmark(SAMPLE_REPLIES, repeat=SAMPLE_REPEAT)
+    for key, value in stats.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+    return 0
+
+
+__all__ = [
+    "ImageReferenceScan",
+    "ImageStageResult",
+    "benchmark",
+    "build_fallback_image_prompt",
+    "build_pollinations_image_url",
+    "clean_fallback_prompt",
+    "cut_image_url",
+    "extract_image_url",
+    "normalize_fallback_prompt",
+    "process_reply",
+    "remove_image_references",
+    "sanitize_image_url",
+    "scan_image_references",
+    "should_request_fallback_image",
+]
+
+
+if __name__ == "__main__":  # pragma: no cover - exercised via CLI
+    sys.exit(main())
@@ -0,0 +1,618 @@
+"""Replay recorded transcripts through a simulated voice turn.
+
+Each transcript follows the path a spoken request takes in ``app.js``:
+local voice-command matching, the chat-completions request, directive
+parsing, the image-fallback stage, speech sanitisation and finally
+:meth:`FakeVoiceLabApp.speak`.  Stages run in their own threads and are
+connected by bounded queues, so a slow stage applies backpressure to the
+ones before it and the transcript file is streamed rather than loaded.
+The last stage runs in the consumer, which makes :meth:`ReplayPipeline.run`
+a generator of finished turns.
+
+Per-stage throughput, input queue depth and latency percentiles are
+collected while the pipeline runs; :func:`format_report` renders them.
+
+State shared between stages follows the order turns pass through them:
+chat history lives in the completion stage and the image model in the
+image stage.  As in the browser, where replies resolve asynchronously, a
+``clear_chat_history`` directive only affects requests the completion
+stage has not sent yet.  The completion stage records the raw reply in
+the history and the image stage replaces it with the final message, as
+``getAIResponse`` stores it; a request sent before that happens carries
+the raw reply instead.  Turns that fail after they were read are answered
+with the browser's apology.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Union
+
+from .image_fallback import ImageStageResult, process_reply
+from .speech import Directives, VoiceCommand, match_voice_command, parse_ai_directives, sanitize_for_speech
+from .sync_api import FakeVoiceLabApp
+
+DEFAULT_SYSTEM_PROMPT = "You are Unity, a helpful AI assistant."
+DEFAULT_QUEUE_SIZE = 64
+HISTORY_LIMIT = 12
+LATENCY_SAMPLE_SIZE = 10_000
+READER_JOIN_TIMEOUT = 0.5
+
+STAGES = ("read", "command", "completion", "directives", "image", "sanitize", "speak")
+
+_IMAGE_COMMANDS = {"copy_image", "save_image", "open_image"}
+_MODEL_COMMANDS = {"set_model_flux": "flux", "set_model_turbo": "turbo", "set_model_kontext": "kontext"}
+_IMAGE_KEYWORDS = ("picture", "image", "photo", "draw", "paint")
+
+FAILED_REPLY = "Sorry, I couldn't get a text response."
+
+_END = object()
+
+
+@dataclass
+class Turn:
+    """A transcript and everything the simulated turn derived from it."""
+
+    index: int
+    transcript: str
+    recorded_reply: Optional[str] = None
+    started: float = 0.0
+    command: Optional[VoiceCommand] = None
+    reply: str = ""
+    directives: Optional[Directives] = None
+    image: Optional[ImageStageResult] = None
+    spoken_text: str = ""
+    spoken: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    history_entry: Optional[Dict[str, str]] = None
+
+
+# Statistics ----------------------------------------------------------------------
+
+
+class _Reservoir:
+    """Fixed-size uniform sample of a stream of latencies."""
+
+    def __init__(self, capacity: int = LATENCY_SAMPLE_SIZE, seed: int = 0) -> None:
+        self.capacity = capacity
+        self.seen = 0
+        self.samples: List[float] = []
+        self._random = random.Random(seed)
+
+    def add(self, value: float) -> None:
+        self.seen += 1
+        if len(self.samples) < self.capacity:
+            self.samples.append(value)
+            return
+        slot = self._random.randrange(self.seen)
+        if slot < self.capacity:
+            self.samples[slot] = value
+
+    def percentile(self, percent: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = max(1, -(-len(ordered) * percent // 100))
+        return ordered[int(rank) - 1]
+
+
+class StageStats:
+    """Throughput, queue depth and latency figures for one pipeline stage.
+
+    ``items`` and the timings only cover turns the stage worked on.  Turns
+    it passed through untouched (voice commands past the command stage, or
+    turns that already failed) are counted in ``skipped`` and turns that
+    failed in the stage in ``errors``.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.skipped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.latencies = _Reservoir()
+        self.queue_depth_max = 0
+        self._queue_depth_total = 0
+        self._queue_samples = 0
+
+    def observe(self, seconds: float) -> None:
+        self.items += 1
+        self.busy_seconds += seconds
+        self.latencies.add(seconds)
+
+    def observe_queue(self, depth: int) -> None:
+        self._queue_samples += 1
+        self._queue_depth_total += depth
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+
+    @property
+    def throughput(self) -> float:
+        """Items per second of busy time, i.e. the stage's capacity."""
+
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+    @property
+    def queue_depth_mean(self) -> float:
+        return self._queue_depth_total / self._queue_samples if self._queue_samples else 0.0
+
+    def percentile_ms(self, percent: float) -> float:
+        return self.latencies.percentile(percent) * 1000
+
+
+# Chat-completions stand-in -------------------------------------------------------
+
+
+class LocalChatCompletions:
+    """In-process stand-in for the Pollinations chat-completions endpoint.
+
+    Requests and responses go through JSON just as they would over HTTP.
+    Recorded replies are returned verbatim; otherwise a short canned reply
+    is generated from the last user message.  ``delay`` simulates network
+    latency in seconds.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.requests = 0
+
+    def post(self, body: str, recorded_reply: Optional[str] = None) -> str:
+        payload = json.loads(body)
+        self.requests += 1
+        if self.delay:
+            time.sleep(self.delay)
+        content = recorded_reply if recorded_reply is not None else self._canned_reply(payload["messages"])
+        return json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    def _canned_reply(self, messages: Sequence[Dict[str, str]]) -> str:
+        request = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        if any(keyword in request.lower() for keyword in _IMAGE_KEYWORDS):
+            return f"Here is what you asked for. Image prompt: \"{request}\""
+        return f"You said: {request}. Tell me more about that."
+
+
+# Pipeline ------------------------------------------------------------------------
+
+
+class ReplayPipeline:
+    """Push transcripts through the simulated voice turn stage by stage."""
+
+    def __init__(
+        self,
+        app: FakeVoiceLabApp,
+        completions: Optional[LocalChatCompletions] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    ) -> None:
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.app = app
+        self.completions = completions or LocalChatCompletions()
+        self.queue_size = queue_size
+        self.system_prompt = system_prompt
+        self.stats: Dict[str, StageStats] = {name: StageStats(name) for name in STAGES}
+        self.turn_latencies = _Reservoir()
+        self.wall_seconds = 0.0
+
+        self._history: List[Dict[str, str]] = []
+        self._clear_history = threading.Event()
+        self._image_model = "flux"
+        self._stop = threading.Event()
+        self._read_error: Optional[BaseException] = None
+
+    # Stage transforms ----------------------------------------------------------------
+    #
+    # Each transform returns whether it did any work on the turn, so turns a
+    # stage merely passes along stay out of its timings.
+
+    def _command_stage(self, turn: Turn) -> bool:
+        turn.command = match_voice_command(turn.transcript)
+        return True
+
+    def _completion_stage(self, turn: Turn) -> bool:
+        if self._clear_history.is_set():
+            self._clear_history.clear()
+            self._history.clear()
+        if turn.command is not None:
+            if turn.command.action == "clear_chat_history":
+                self._history.clear()
+            return False
+
+        self._history.append({"role": "user", "content": turn.transcript})
+        del self._history[:-HISTORY_LIMIT]
+        body = json.dumps(
+            {"messages": [{"role": "system", "content": self.system_prompt}, *self._history], "model": "unity"}
+        )
+        data = json.loads(self.completions.post(body, turn.recorded_reply))
+        reply = (data.get("choices") or [{}])[0].get("message", {}).get("content") or ""
+        if not reply:
+            raise ValueError("Received empty response from the chat-completions stand-in")
+        turn.reply = reply
+        turn.history_entry = {"role": "assistant", "content": reply}
+        self._history.append(turn.history_entry)
+        return True
+
+    def _directives_stage(self, turn: Turn) -> bool:
+        if turn.command is not None:
+            return False
+        turn.directives = parse_ai_directives(turn.reply)
+        if "clear_chat_history" in turn.directives.commands:
+            self._clear_history.set()
+        return True
+
+    def _image_stage(self, turn: Turn) -> bool:
+        if turn.command is not None:
+            if turn.command.action in _MODEL_COMMANDS:
+                self._image_model = _MODEL_COMMANDS[turn.command.action]
+            return False
+        if turn.directives is None:
+            return False
+        for command in turn.directives.commands:
+            self._image_model = _MODEL_COMMANDS.get(command, self._image_model)
+        turn.image = process_reply(
+            turn.transcript,
+            turn.directives.cleaned_text or turn.reply,
+            raw_text=turn.reply,
+            model=self._image_model,
+        )
+        if turn.history_entry is not None:
+            turn.history_entry["content"] = turn.image.text or "[image]"
+        return True
+
+    def _sanitize_stage(self, turn: Turn) -> bool:
+        if turn.image is None:
+            return False
+        turn.spoken_text = sanitize_for_speech(turn.image.text)
+        return True
+
+    def _speak_stage(self, turn: Turn) -> bool:
+        app = self.app
+        start = len(app.state["speakCalls"])
+        if turn.command is not None:
+            self._apply_voice_command(turn.command)
+        elif turn.directives is not None:
+            for command in turn.directives.commands:
+                if command not in _IMAGE_COMMANDS:
+                    self._apply_directive(command)
+            suppressed = {"shutup", "stop_speaking"} & set(turn.directives.commands)
+            if turn.spoken_text and not suppressed:
+                app.speak(turn.spoken_text)
+        else:
+            return False
+        turn.spoken = list(app.state["speakCalls"][start:])
+        app.mutations.flush()
+        return True
+
+    def _speak_failure(self, turn: Turn) -> None:
+        self.app.speak(FAILED_REPLY)
+        turn.spoken = [FAILED_REPLY]
+        self.app.mutations.flush()
+
+    def _apply_voice_command(self, command: VoiceCommand) -> None:
+        if command.action == "switch_theme_light":
+            was_updated = self.app.current_theme != "light"
+            self.app.apply_theme("light")
+            self.app.speak("Switched to the light theme." if was_updated else "Light theme is already active.")
+            return
+        if command.announce is not None:
+            # Model and history changes live in earlier stages; only the announcement is left.
+            self.app.speak(command.announce)
+            return
+        self._apply_directive(command.action)
+
+    def _apply_directive(self, command: str) -> None:
+        app = self.app
+        if command == "mute_microphone":
+            app.set_muted_state(True, announce=True)
+        elif command == "unmute_microphone":
+            app.set_muted_state(False, announce=True)
+        elif command in ("theme_light", "theme_dark"):
+            app.apply_theme(command[len("theme_") :], announce=True)
+        elif command in _MODEL_COMMANDS:
+            app.speak(f"Image model set to {_MODEL_COMMANDS[command]}.")
+        elif command == "clear_chat_history":
+            app.speak("Chat history cleared.")
+
+    # Plumbing ------------------------------------------------------------------------
+
+    def _put(self, target: "queue.Queue[Any]", item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: "queue.Queue[Any]") -> Any:
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.05)
+            except queue.Empty:
+                continue
+        return _END
+
+    @staticmethod
+    def _depth(source: "queue.Queue[Any]") -> int:
+        """Return the number of turns waiting in ``source``, ignoring the end marker."""
+
+        with source.mutex:
+            pending = source.queue
+            return len(pending) - (1 if pending and pending[-1] is _END else 0)
+
+    def _read(self, lines: Iterable[Union[str, bytes]], output: "queue.Queue[Any]") -> None:
+        stats = self.stats["read"]
+        index = 0
+        iterator = iter(lines)
+        try:
+            while not self._stop.is_set():
+                # Timed from before the fetch so file I/O counts as read time.
+                started = time.perf_counter()
+                line = next(iterator, None)
+                if line is None:
+                    return
+                if not line.strip():
+                    continue
+                turn = Turn(index=index, transcript="", started=started)
+                index += 1
+                try:
+                    if isinstance(line, bytes):
+                        line = line.decode("utf-8")
+                    record = json.loads(line)
+                    if isinstance(record, str):
+                        record = {"transcript": record}
+                    turn.transcript = str(record.get("transcript", record.get("text", ""))).strip()
+                    reply = record.get("reply")
+                    turn.recorded_reply = None if reply is None else str(reply)
+                except (ValueError, AttributeError) as error:
+                    turn.error = f"read: {error}"
+                    stats.errors += 1
+                else:
+                    stats.observe(time.perf_counter() - started)
+                if not self._put(output, turn):
+                    return
+        except Exception as error:  # noqa: BLE001 - re-raised from run()
+            self._read_error = error
+        finally:
+            self._put(output, _END)
+
+    @staticmethod
+    def _process(name: str, transform: Callable[[Turn], bool], turn: Turn, stats: StageStats) -> None:
+        """Run one stage on ``turn`` and record the outcome in ``stats``."""
+
+        if turn.error is not None:
+            stats.skipped += 1
+            return
+        started = time.perf_counter()
+        try:
+            worked = transform(turn)
+        except Exception as error:  # noqa: BLE001 - recorded on the turn
+            turn.error = f"{name}: {error}"
+            stats.errors += 1
+            return
+        if worked:
+            stats.observe(time.perf_counter() - started)
+        else:
+            stats.skipped += 1
+
+    def _work(
+        self,
+        name: str,
+        transform: Callable[[Turn], bool],
+        source: "queue.Queue[Any]",
+        output: "queue.Queue[Any]",
+    ) -> None:
+        stats = self.stats[name]
+        while True:
+            depth = self._depth(source)
+            turn = self._get(source)
+            if turn is _END:
+                self._put(output, _END)
+                return
+            stats.observe_queue(depth)
+            self._process(name, transform, turn, stats)
+            if not self._put(output, turn):
+                return
+
+    def run(self, lines: Iterable[Union[str, bytes]]) -> Iterator[Turn]:
+        """Yield each turn once it has been spoken, in transcript order.
+
+        ``lines`` holds one JSON value per line: an object with a
+        ``transcript`` (or ``text``) key and an optional recorded ``reply``,
+        or a bare string.  Byte lines are decoded as UTF-8.  Turns that fail
+        carry the stage and message in :attr:`Turn.error` and skip the
+        remaining stages; unless the line could not be read, the apology is
+        spoken instead.  If iterating ``lines`` itself fails, the turns read
+        so far are yielded and the error is then raised.
+        """
+
+        transforms = (
+            ("command", self._command_stage),
+            ("completion", self._completion_stage),
+            ("directives", self._directives_stage),
+            ("image", self._image_stage),
+            ("sanitize", self._sanitize_stage),
+        )
+        queues: List["queue.Queue[Any]"] = [queue.Queue(self.queue_size) for _ in range(len(transforms) + 1)]
+        threads = [threading.Thread(target=self._read, args=(lines, queues[0]), daemon=True)]
+        for position, (name, transform) in enumerate(transforms):
+            threads.append(
+                threading.Thread(
+                    target=self._work,
+                    args=(name, transform, queues[position], queues[position + 1]),
+                    daemon=True,
+                )
+            )
+
+        self._stop.clear()
+        self._read_error = None
+        wall_started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        speak_stats = self.stats["speak"]
+        try:
+            while True:
+                depth = self._depth(queues[-1])
+                turn = self._get(queues[-1])
+                if turn is _END:
+                    if self._read_error is not None:
+                        raise self._read_error
+                    return
+                speak_stats.observe_queue(depth)
+                if turn.error is not None and not turn.error.startswith("read:"):
+                    self._speak_failure(turn)
+                self._process("speak", self._speak_stage, turn, speak_stats)
+                finished = time.perf_counter()
+                if turn.error is None:
+                    self.turn_latencies.add(finished - turn.started)
+                self.wall_seconds = finished - wall_started
+                yield turn
+        finally:
+            self._stop.set()
+            # The reader may be blocked on stdin until the next line arrives;
+            # it is a daemon thread, so give up on it rather than hang.
+            threads[0].join(READER_JOIN_TIMEOUT)
+            for thread in threads[1:]:
+                thread.join()
+
+    def bottleneck(self) -> Optional[StageStats]:
+        """Return the stage that spent the most time busy."""
+
+        busiest = max(self.stats.values(), key=lambda stats: stats.busy_seconds)
+        return busiest if busiest.items else None
+
+
+# Reporting -----------------------------------------------------------------------
+
+
+def format_report(pipeline: ReplayPipeline, turns: int, errors: int) -> str:
+    """Render the pipeline statistics as a plain-text table."""
+
+    header = (
+        f"{'stage':<11}{'items':>8}{'skipped':>9}{'errors':>8}{'busy s':>10}{'items/s':>12}"
+        f"{'queue avg':>11}{'queue max':>11}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+    )
+    rows = [header, "-" * len(header)]
+    for stats in pipeline.stats.values():
+        rows.append(
+            f"{stats.name:<11}{stats.items:>8}{stats.skipped:>9}{stats.errors:>8}"
+            f"{stats.busy_seconds:>10.3f}{stats.throughput:>12.1f}"
+            f"{stats.queue_depth_mean:>11.1f}{stats.queue_depth_max:>11}"
+            f"{stats.percentile_ms(50):>9.3f}{stats.percentile_ms(90):>9.3f}{stats.percentile_ms(99):>9.3f}"
+        )
+
+    wall = pipeline.wall_seconds
+    latencies = pipeline.turn_latencies
+    rows.append("")
+    rows.append(
+        f"turns: {turns}  errors: {errors}  wall: {wall:.3f}s  "
+        f"turns/s: {turns / wall if wall else 0.0:.1f}"
+    )
+    rows.append(
+        "turn latency ms (completed turns): "
+        f"p50 {latencies.percentile(50) * 1000:.3f}  "
+        f"p90 {latencies.percentile(90) * 1000:.3f}  "
+        f"p99 {latencies.percentile(99) * 1000:.3f}"
+    )
+    bottleneck = pipeline.bottleneck()
+    if bottleneck is not None:
+        rows.append(f"bottleneck: {bottleneck.name}")
+    return "\n".join(rows)
+
+
+def replay(
+    source: Union[TextIO, BinaryIO],
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    completion_delay: float = 0.0,
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    output: Optional[TextIO] = None,
+) -> int:
+    """Replay every transcript in ``source`` and print the statistics report.
+
+    Returns 1 when reading ``source`` fails part-way; the report then covers
+    the turns read before the failure.
+    """
+
+    pipeline = ReplayPipeline(
+        FakeVoiceLabApp(),
+        completions=LocalChatCompletions(delay=completion_delay),
+        queue_size=queue_size,
+        system_prompt=system_prompt,
+    )
+    turns = errors = 0
+    status = 0
+    try:
+        # Speech calls are only needed per turn; drop them so long replays stay flat.
+        for turn in pipeline.run(source):
+            turns += 1
+            if turn.error:
+                errors += 1
+                print(f"turn {turn.index}: {turn.error}", file=sys.stderr)
+            pipeline.app.state["speakCalls"].clear()
+    except Exception as error:  # noqa: BLE001 - reported with the partial statistics
+        print(f"replay stopped after {turns} turns: failed to read transcripts: {error}", file=sys.stderr)
+        status = 1
+    print(format_report(pipeline, turns, errors), file=output or sys.stdout)
+    return status
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Handle ``python -m playwright replay``."""
+
+    parser = argparse.ArgumentParser(
+        prog="python -m playwright replay",
+        description="Replay recorded transcripts through the simulated voice turn.",
+    )
+    parser.add_argument("transcripts", help="JSON Lines file of transcripts, or - for stdin")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="capacity of each stage queue")
+    parser.add_argument(
+        "--completion-delay",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="simulated chat-completions latency in milliseconds",
+    )
+    parser.add_argument("--system-prompt", metavar="PATH", help="file holding the system prompt")
+    args = parser.parse_args(argv)
+
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+
+    system_prompt = DEFAULT_SYSTEM_PROMPT
+    if args.system_prompt:
+        try:
+            with open(args.system_prompt, encoding="utf-8") as handle:
+                system_prompt = handle.read()
+        except (OSError, UnicodeDecodeError) as error:
+            parser.error(f"cannot read system prompt: {error}")
+
+    # Read bytes so an undecodable line fails on its own instead of the
+    # whole buffered chunk it arrived in.
+    delay = args.completion_delay / 1000
+    if args.transcripts == "-":
+        return replay(sys.stdin.buffer, args.queue_size, delay, system_prompt)
+    try:
+        handle = open(args.transcripts, "rb")
+    except OSError as error:
+        parser.error(f"cannot open transcripts: {error}")
+    with handle:
+        return replay(handle, args.queue_size, delay, system_prompt)
+
+
+__all__ = [
+    "FAILED_REPLY",
+    "LocalChatCompletions",
+    "ReplayPipeline",
+    "StageStats",
+    "Turn",
+    "format_report",
+    "main",
+    "replay",
+]
@@ -0,0 +1,322 @@
+"""Python reference of the voice-turn text handling in ``app.js``.
+
+Covers the three steps a turn takes around the chat-completions call:
+``handleVoiceCommand`` decides whether a transcript is a local command,
+``parseAiDirectives`` pulls command directives out of the reply and
+``sanitizeForSpeech`` strips URLs and command artefacts before the reply
+is spoken.  Patterns are compiled once at import time.
+
+As with :mod:`playwright.image_fallback`, the port follows the intent of
+``app.js`` where its patterns were mangled by escaping: several of them
+begin with an escaped backslash and so never match ``[command: ...]``,
+and the slash-command pattern expects a space after the slash.  Here
+those match ``[command: ...]`` and ``/theme_dark`` as intended.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+COMMAND_TOKENS = (
+    "open_image",
+    "save_image",
+    "copy_image",
+    "mute_microphone",
+    "unmute_microphone",
+    "stop_speaking",
+    "shutup",
+    "set_model_flux",
+    "set_model_turbo",
+    "set_model_kontext",
+    "clear_chat_history",
+    "theme_light",
+    "theme_dark",
+)
+
+
+# Voice commands ------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class VoiceCommand:
+    """A local command recognised in a transcript.
+
+    ``action`` is a directive name understood by ``executeAiCommand``,
+    except ``switch_theme_light``: the later light-theme branch of
+    ``handleVoiceCommand``, which applies the theme and then says whether
+    it changed.  ``announce`` is the message spoken after the change;
+    ``None`` means the command announces itself (mute and theme changes)
+    or stays silent.
+    """
+
+    action: str
+    announce: Optional[str] = None
+
+
+# Each entry mirrors one ``if`` of ``handleVoiceCommand`` in order: phrases
+# matched as substrings, phrases matched exactly and the resulting command.
+_VOICE_COMMANDS: Tuple[Tuple[Tuple[str, ...], Tuple[str, ...], VoiceCommand], ...] = (
+    (("mute my mic", "mute microphone"), ("mute",), VoiceCommand("mute_microphone")),
+    (
+        ("unmute my mic", "unmute microphone", "turn on the mic"),
+        ("unmute",),
+        VoiceCommand("unmute_microphone"),
+    ),
+    (("shut up", "be quiet"), (), VoiceCommand("stop_speaking")),
+    (("light mode", "light theme", "day mode"), (), VoiceCommand("theme_light")),
+    (("dark mode", "dark theme", "night mode"), (), VoiceCommand("theme_dark")),
+    (("copy image", "copy this image"), (), VoiceCommand("copy_image")),
+    (("save image", "download image"), (), VoiceCommand("save_image")),
+    (("open image", "open this image"), (), VoiceCommand("open_image")),
+    (("use flux model", "switch to flux"), (), VoiceCommand("set_model_flux", "Image model set to flux.")),
+    (("use turbo model", "switch to turbo"), (), VoiceCommand("set_model_turbo", "Image model set to turbo.")),
+    (
+        ("use kontext model", "switch to kontext"),
+        (),
+        VoiceCommand("set_model_kontext", "Image model set to kontext."),
+    ),
+    (
+        ("clear history", "delete history", "clear chat"),
+        (),
+        VoiceCommand("clear_chat_history", "Chat history cleared."),
+    ),
+    # Reached only for phrasings the earlier theme branch does not catch.
+    (("change to light", "switch to light", "change them to light"), (), VoiceCommand("switch_theme_light")),
+)
+
+
+def match_voice_command(transcript: str) -> Optional[VoiceCommand]:
+    """Return the local command for ``transcript`` or ``None`` to ask the AI."""
+
+    lowered = transcript.lower()
+    for phrases, exact, command in _VOICE_COMMANDS:
+        if lowered in exact or any(phrase in lowered for phrase in phrases):
+            return command
+    return None
+
+
+# Directive parsing ---------------------------------------------------------------
+
+_DIRECTIVE_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"\[command:\s*([^\]]+)\]",
+        r"\{command:\s*([^}]*)\}",
+        r"<command[^>]*>\s*([^<]*)</command>",
+        r"\bcommand\s*[:=]\s*([a-z0-9_\-]+)",
+        r"\bcommands?\s*[:=]\s*([a-z0-9_\-]+)",
+        r"\baction\s*[:=]\s*([a-z0-9_\-]+)",
+        r"\b(?:command|action)\s*(?:->|=>|::)\s*([a-z0-9_\-]+)",
+        r"\bcommand\s*\(\s*([^)]+?)\s*\)",
+    )
+)
+_SLASH_COMMAND_PATTERN = re.compile(r"(?:^|\s)/(" + "|".join(COMMAND_TOKENS) + r")\b", re.IGNORECASE)
+_DIRECTIVE_BLOCK_PATTERN = re.compile(
+    r"(?:^|\n)\s*(?:commands?|actions?)\s*:?\s*(?:\n|$)((?:\s*[-*•]?\s*[a-z0-9_\-]+\s*(?:\(\))?\s*(?:\n|$))+)",
+    re.IGNORECASE,
+)
+_COMMAND_SEPARATOR_PATTERN = re.compile(r"[\s-]+")
+_BLOCK_LINE_SPLIT_PATTERN = re.compile(r"\n+")
+_BLOCK_LINE_PREFIX_PATTERN = re.compile(r"^[^a-z0-9]+", re.IGNORECASE)
+_EXCESS_NEWLINES_PATTERN = re.compile(r"\n{3,}")
+
+
+def normalize_command_value(value: str) -> str:
+    """Normalise a directive such as ``"Theme Dark"`` to ``"theme_dark"``."""
+
+    return _COMMAND_SEPARATOR_PATTERN.sub("_", value).strip().lower()
+
+
+@dataclass
+class Directives:
+    """Reply text with directives removed and the commands they named."""
+
+    cleaned_text: str
+    commands: List[str] = field(default_factory=list)
+
+
+def parse_ai_directives(response_text: str) -> Directives:
+    """Extract command directives from an AI reply, as ``parseAiDirectives`` does."""
+
+    if not isinstance(response_text, str) or not response_text.strip():
+        return Directives("")
+
+    commands: List[str] = []
+
+    def collect(match: "re.Match[str]", replacement: str = " ") -> str:
+        value = match.group(1)
+        if value:
+            normalized = normalize_command_value(value)
+            if normalized:
+                commands.append(normalized)
+        return replacement
+
+    text = response_text
+    for pattern in _DIRECTIVE_PATTERNS:
+        text = pattern.sub(collect, text)
+    text = _SLASH_COMMAND_PATTERN.sub(collect, text)
+
+    def collect_block(match: "re.Match[str]") -> str:
+        for line in _BLOCK_LINE_SPLIT_PATTERN.split(match.group(1)):
+            line = _BLOCK_LINE_PREFIX_PATTERN.sub("", line).strip()
+            if line:
+                normalized = normalize_command_value(line.replace("()", ""))
+                if normalized:
+                    commands.append(normalized)
+        return "\n"
+
+    text = _DIRECTIVE_BLOCK_PATTERN.sub(collect_block, text)
+    cleaned = _EXCESS_NEWLINES_PATTERN.sub("\n\n", text).strip()
+    return Directives(cleaned, list(dict.fromkeys(commands)))
+
+
+# Speech sanitisation -------------------------------------------------------------
+
+_SEGMENT_LEADING_PATTERN = re.compile("^[<({\\[\\s'\"“”‘’`]+")
+_SEGMENT_TRAILING_PATTERN = re.compile("[>)}\\]\\s'\"“”‘’`]+$")
+_SEGMENT_PUNCTUATION_PATTERN = re.compile(r"[.,!?;:]+$")
+_BARE_DOMAIN_PATTERN = re.compile(r"^[a-z0-9.-]+\.[a-z]{2,}(?:[/?#].*)?$")
+
+
+def is_likely_url_segment(segment: str) -> bool:
+    """Return ``True`` when ``segment`` looks like a URL or bare domain."""
+
+    if not isinstance(segment, str) or not segment.strip():
+        return False
+    cleaned = _SEGMENT_LEADING_PATTERN.sub("", segment)
+    cleaned = _SEGMENT_TRAILING_PATTERN.sub("", cleaned)
+    cleaned = _SEGMENT_PUNCTUATION_PATTERN.sub("", cleaned).strip()
+    if not cleaned:
+        return False
+    normalized = cleaned.lower()
+    if normalized.startswith(("http://", "https://", "www.")) or "://" in normalized:
+        return True
+    return _BARE_DOMAIN_PATTERN.match(normalized) is not None
+
+
+_MARKDOWN_IMAGE_TARGET_PATTERN = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)")
+_MARKDOWN_LINK_TARGET_PATTERN = re.compile(r"\[([^\]]*)\]\(([^)]+)\)")
+_MARKDOWN_COMMAND_LINK_PATTERN = re.compile(r"\[\s*(?:command|action)[^\]]*\]\([^)]*\)", re.IGNORECASE)
+
+
+def _keep_link_text(match: "re.Match[str]") -> str:
+    return match.group(1) if is_likely_url_segment(match.group(2)) else match.group(0)
+
+
+def _remove_markdown_link_targets(value: str) -> str:
+    value = _MARKDOWN_IMAGE_TARGET_PATTERN.sub(_keep_link_text, value)
+    value = _MARKDOWN_LINK_TARGET_PATTERN.sub(_keep_link_text, value)
+    return _MARKDOWN_COMMAND_LINK_PATTERN.sub(" ", value)
+
+
+def _compile_all(*patterns: str, flags: int = re.IGNORECASE) -> Tuple["re.Pattern[str]", ...]:
+    return tuple(re.compile(pattern, flags) for pattern in patterns)
+
+
+_COMMAND_ARTIFACT_PATTERNS = _compile_all(
+    r"\[[^\]]*\bcommand\b[^\]]*\]",
+    r"\([^)]*\bcommand\b[^)]*\)",
+    r"<[^>]*\bcommand\b[^>]*>",
+    r"\bcommands?\s*[:=-]\s*[a-z0-9_\s-]+",
+    r"\bactions?\s*[:=-]\s*[a-z0-9_\s-]+",
+    r"\b(?:execute|run)\s+command\s*(?:[:=-]\s*)?[a-z0-9_-]*",
+    r"\bcommand\s*(?:[:=-]\s*|\s+)(?:[a-z0-9_-]+(?:\s+[a-z0-9_-]+)*)?",
+)
+_COMMAND_LINE_PATTERN = re.compile(r"^\s*[-*]?\s*(?:command|action)[^\n]*$", re.IGNORECASE | re.MULTILINE)
+
+# Replaced with a space, applied in order.
+_SPEECH_DIRECTIVE_PATTERNS = _compile_all(
+    r"\[command:[^\]]*\]",
+    r"\{command:[^}]*\}",
+    r"<command[^>]*>[^<]*</command>",
+    r"\b(?:command|action)\s*[:=]\s*([a-z0-9_\-]+)",
+    r"\bcommands?\s*[:=]\s*([a-z0-9_\-]+)",
+    r"\b(?:command|action)\s*(?:->|=>|::)\s*([a-z0-9_\-]+)",
+    r"\bcommand\s*\([^)]*\)",
+)
+_POLLINATIONS_PATTERNS = _compile_all(
+    r"https?://\S*images?.pollinations.ai\S*",
+    r"\b\S*images?.pollinations.ai\S*\b",
+)
+_GENERIC_URL_PATTERNS = _compile_all(r"https?://\S+", r"\bwww\.[^\s)]+")
+# Pairs of (pattern, replacement) applied in order.
+_SPOKEN_URL_PATTERNS = tuple(
+    (re.compile(pattern, re.IGNORECASE), replacement)
+    for pattern, replacement in (
+        (r"h\s*t\s*t\s*p\s*s?\s*:\s*//\s*[\w\-./%#&=]+", " "),
+        (r"\bhttps?\b", ""),
+        (r"\bwww\b", ""),
+        (r"h\s*t\s*t\s*p\s*s?\s*(?:[:=]|colon)\s*//\s*[\w\-./%#&=]+", " "),
+        (r"\b(?:h\s*t\s*t\s*p\s*s?|h\s*t\s*t\s*p)\b", ""),
+        (r"\bcolon\b", ""),
+        (r"\bslash\b", ""),
+    )
+)
+_WHITESPACE_SPLIT_PATTERN = re.compile(r"(\s+)")
+_URL_FRAGMENT_PATTERN = re.compile(r"(?:https?|www|://|\.com|\.net|\.org|\.io|\.ai|\.co|\.gov|\.edu)", re.IGNORECASE)
+_COMMAND_WORD_PATTERN = re.compile(r"\bcommand\b", re.IGNORECASE)
+_IMAGE_LINK_WORD_PATTERN = re.compile(r"(?:image|artwork|photo)\s+(?:url|link)", re.IGNORECASE)
+_SPEECH_CLEANUP_PATTERNS = tuple(
+    (re.compile(pattern, flags), replacement)
+    for pattern, flags, replacement in (
+        (r"\s{2,}", 0, " "),
+        (r"\s+([.,!?;:])", 0, r"\1"),
+        (r"\(\s*\)", 0, ""),
+        (r"\[\s*\]", 0, ""),
+        (r"\{\s*\}", 0, ""),
+        (r"\b(?:https?|www)\b", re.IGNORECASE, ""),
+        (r"\b[a-z0-9]+\s+dot\s+[a-z0-9]+\b", re.IGNORECASE, ""),
+        (r"\b(?:dot\s+)(?:com|net|org|io|ai|co|gov|edu|xyz)\b", re.IGNORECASE, ""),
+        (r"<\s*>", 0, ""),
+        (r"\bcommand\b", re.IGNORECASE, ""),
+        (r"\b(?:image|artwork|photo)\s+(?:url|link)\b.*$", re.IGNORECASE | re.MULTILINE, ""),
+    )
+)
+
+
+def _is_unspeakable(part: str) -> bool:
+    return (
+        is_likely_url_segment(part)
+        or _URL_FRAGMENT_PATTERN.search(part) is not None
+        or _COMMAND_WORD_PATTERN.search(part) is not None
+        or _IMAGE_LINK_WORD_PATTERN.search(part) is not None
+    )
+
+
+def sanitize_for_speech(text: str) -> str:
+    """Strip URLs, directives and command words so the text reads naturally aloud."""
+
+    if not isinstance(text, str):
+        return ""
+
+    for pattern in _SPEECH_DIRECTIVE_PATTERNS:
+        text = pattern.sub(" ", text)
+    for pattern in _POLLINATIONS_PATTERNS:
+        text = pattern.sub("", text)
+    text = _remove_markdown_link_targets(text)
+    for pattern in _COMMAND_ARTIFACT_PATTERNS:
+        text = pattern.sub(" ", text)
+    text = _COMMAND_LINE_PATTERN.sub(" ", text)
+    for pattern in _GENERIC_URL_PATTERNS:
+        text = pattern.sub(" ", text)
+    for pattern, replacement in _SPOKEN_URL_PATTERNS:
+        text = pattern.sub(replacement, text)
+
+    text = "".join("" if _is_unspeakable(part) else part for part in _WHITESPACE_SPLIT_PATTERN.split(text))
+    for pattern, replacement in _SPEECH_CLEANUP_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+__all__ = [
+    "COMMAND_TOKENS",
+    "Directives",
+    "VoiceCommand",
+    "is_likely_url_segment",
+    "match_voice_command",
+    "normalize_command_value",
+    "parse_ai_directives",
+    "sanitize_for_speech",
+]
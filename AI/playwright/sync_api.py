@@ -11,7 +11,7 @@ import re
 import time
 from contextlib import AbstractContextManager
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 
 class SyncPlaywrightContext(AbstractContextManager):
@@ -83,46 +83,148 @@ class BrowserContextStub:
         self._pages.clear()
 
 
+@dataclass(frozen=True)
+class MutationRecord:
+    """A single observed change, modelled on the DOM ``MutationRecord``.
+
+    ``type`` is ``"attributes"`` for ``data-*`` changes, ``"class"`` for class
+    list changes and ``"text"`` for text content.  Class records report
+    membership as booleans.
+    """
+
+    target: str
+    type: str
+    name: Optional[str]
+    old_value: Any
+    new_value: Any
+
+
+MutationCallback = Callable[[List[MutationRecord]], None]
+
+
+class MutationLog:
+    """Collect element changes and deliver them in batches per virtual tick.
+
+    Changes to the same element property within a tick are coalesced into
+    one record holding the first old value and the last new value; records
+    whose value ends up unchanged are dropped, so rapid toggles that return
+    to the starting state produce no delivery at all.
+    """
+
+    def __init__(self) -> None:
+        self.tick = 0
+        self._pending: Dict[Tuple[str, str, Optional[str]], MutationRecord] = {}
+        self._subscribers: List[MutationCallback] = []
+
+    def record(self, target: str, kind: str, name: Optional[str], old_value: Any, new_value: Any) -> None:
+        key = (target, kind, name)
+        previous = self._pending.get(key)
+        if previous is not None:
+            old_value = previous.old_value
+        self._pending[key] = MutationRecord(target, kind, name, old_value, new_value)
+
+    def subscribe(self, callback: MutationCallback) -> Callable[[], None]:
+        """Register ``callback`` for batched deliveries and return a disconnect function."""
+
+        self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def take_records(self) -> List[MutationRecord]:
+        """Return and clear the coalesced records of the current tick without delivering them."""
+
+        records = [record for record in self._pending.values() if record.old_value != record.new_value]
+        self._pending.clear()
+        return records
+
+    def flush(self) -> List[MutationRecord]:
+        """End the current tick and deliver its records to every subscriber."""
+
+        records = self.take_records()
+        self.tick += 1
+        if records:
+            for callback in list(self._subscribers):
+                callback(list(records))
+        return records
+
+
 @dataclass
 class ElementState:
-    """Simplified representation of a DOM element."""
+    """Simplified representation of a DOM element.
+
+    Elements created with a ``log`` report their changes to it under
+    ``name``; plain elements behave as simple containers.
+    """
 
     text: str = ""
     classes: set[str] = field(default_factory=set)
     dataset: Dict[str, str] = field(default_factory=dict)
+    name: str = field(default="", compare=False)
+    log: Optional[MutationLog] = field(default=None, repr=False, compare=False)
 
     def class_contains(self, name: str) -> bool:
         return name in self.classes
 
     def add_class(self, name: str) -> None:
-        self.classes.add(name)
+        self.toggle_class(name, True)
 
     def remove_class(self, name: str) -> None:
-        self.classes.discard(name)
+        self.toggle_class(name, False)
 
     def toggle_class(self, name: str, state: bool) -> None:
+        present = name in self.classes
         if state:
             self.classes.add(name)
         else:
             self.classes.discard(name)
+        if present != state and self.log is not None:
+            self.log.record(self.name, "class", name, present, state)
+
+    def set_text(self, text: str) -> None:
+        old_value = self.text
+        self.text = text
+        if old_value != text and self.log is not None:
+            self.log.record(self.name, "text", None, old_value, text)
+
+    def set_data(self, key: str, value: str) -> None:
+        old_value = self.dataset.get(key)
+        self.dataset[key] = value
+        if old_value != value and self.log is not None:
+            self.log.record(self.name, "attributes", f"data-{key}", old_value, value)
+
+
+def default_test_state() -> Dict[str, Any]:
+    """Return a fresh ``window.__testState`` as installed by the test init script."""
+
+    return {
+        "speakCalls": [],
+        "recognitionStartCalls": 0,
+        "recognitionStopCalls": 0,
+        "getUserMediaCalls": 0,
+    }
 
 
 class FakeVoiceLabApp:
     """Minimal simulation of the front-end logic needed for tests."""
 
-    def __init__(self, test_state: Dict[str, Any]) -> None:
-        self.state = test_state
+    def __init__(self, test_state: Optional[Dict[str, Any]] = None) -> None:
+        self.state = test_state if test_state is not None else default_test_state()
         self.current_theme = "dark"
         self.is_muted = True
+        self.mutations = MutationLog()
 
-        self.body = ElementState()
+        self.body = ElementState(name="body", log=self.mutations)
         self.body.dataset["theme"] = "dark"
         self.body.classes.update({"js-enabled"})
 
-        self.user_circle = ElementState()
-        self.mute_indicator = ElementState()
+        self.user_circle = ElementState(name="user_circle", log=self.mutations)
+        self.mute_indicator = ElementState(name="mute_indicator", log=self.mutations)
         self.mute_indicator.dataset["state"] = "muted"
-        self.indicator_text = ElementState("Tap or click anywhere to unmute")
+        self.indicator_text = ElementState("Tap or click anywhere to unmute", name="indicator_text", log=self.mutations)
 
     # Event handlers ------------------------------------------------------------------
 
@@ -143,8 +245,8 @@ class FakeVoiceLabApp:
                 self.state["recognitionStopCalls"] += 1
             self.is_muted = True
             self.user_circle.toggle_class("is-listening", False)
-            self.mute_indicator.dataset["state"] = "muted"
-            self.indicator_text.text = "Tap or click anywhere to unmute"
+            self.mute_indicator.set_data("state", "muted")
+            self.indicator_text.set_text("Tap or click anywhere to unmute")
             if announce:
                 self.speak("Microphone muted.")
         else:
@@ -152,8 +254,8 @@ class FakeVoiceLabApp:
                 self.state["recognitionStartCalls"] += 1
             self.is_muted = False
             self.user_circle.toggle_class("is-listening", True)
-            self.mute_indicator.dataset["state"] = "listening"
-            self.indicator_text.text = "Listening… tap to mute"
+            self.mute_indicator.set_data("state", "listening")
+            self.indicator_text.set_text("Listening… tap to mute")
             if announce:
                 self.speak("Microphone unmuted.")
 
@@ -161,7 +263,7 @@ class FakeVoiceLabApp:
         normalized = "light" if theme == "light" else "dark"
         changed = force or normalized != self.current_theme
         self.current_theme = normalized
-        self.body.dataset["theme"] = normalized
+        self.body.set_data("theme", normalized)
 
         if announce:
             if changed:
@@ -198,12 +300,7 @@ class PageStub:
     """Emulate the subset of Playwright's :class:`Page` used in tests."""
 
     def __init__(self) -> None:
-        self._test_state: Dict[str, Any] = {
-            "speakCalls": [],
-            "recognitionStartCalls": 0,
-            "recognitionStopCalls": 0,
-            "getUserMediaCalls": 0,
-        }
+        self._test_state = default_test_state()
         self._app: Optional[FakeVoiceLabApp] = None
         self._init_scripts: List[str] = []
 
@@ -237,6 +334,7 @@ class PageStub:
             return
         if selector == "body" and event == "click":
             self._app.handle_body_click()
+        self._end_tick()
 
     def wait_for_function(self, function_body: str, timeout: int = 10000) -> None:
         end = time.monotonic() + timeout / 1000
@@ -253,11 +351,22 @@ class PageStub:
             return self._app.text_content(selector)
         return None
 
+    def _end_tick(self) -> None:
+        """Deliver the mutations of the task that just ran, like a microtask checkpoint."""
+
+        if self._app:
+            self._app.mutations.flush()
+
     # JavaScript evaluation -----------------------------------------------------------
 
     def evaluate(self, expression: str) -> Any:
-        expression = expression.strip()
+        # Flush only on success so a failing subscriber cannot mask the
+        # expression's own error; pending changes go out with the next tick.
+        result = self._evaluate_expression(expression.strip())
+        self._end_tick()
+        return result
 
+    def _evaluate_expression(self, expression: str) -> Any:
         if expression.startswith("window.__testState.") and "=" in expression:
             return self._assign_test_state(expression)
 
@@ -425,4 +534,4 @@ class PageStub:
         return options
 
 
-__all__ = ["sync_playwright"]
+__all__ = ["MutationLog", "MutationRecord", "default_test_state", "sync_playwright"]
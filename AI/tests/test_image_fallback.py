@@ -0,0 +1,147 @@
+import pytest
+
+from playwright.image_fallback import (
+    SAMPLE_REPLIES,
+    benchmark,
+    build_fallback_image_prompt,
+    normalize_fallback_prompt,
+    build_pollinations_image_url,
+    cut_image_url,
+    extract_image_url,
+    process_reply,
+    remove_image_references,
+    scan_image_references,
+    should_request_fallback_image,
+)
+
+
+PARITY_CORPUS = [
+    "Here you go! ![neon skyline](https://image.pollinations.ai/prompt/neon%20skyline?seed=7)",
+    "Image URL: https://example.com/cat.png. Hope you like it.",
+    "Take a look [here](https://example.com/forest.jpg) and tell me what you think.",
+    "Two images: ![a](https://a.example/1.png) and ![b](https://b.example/2.png).",
+    "Link first https://example.com/page then ![pic](https://example.com/pic.png)",
+    "Repeated HTTPS://EXAMPLE.COM/x.png and https://example.com/x.png again",
+    "No images in this reply at all.",
+    "Artwork link: <https://example.com/art.png>",
+    "Seeded [render](https://img.example/r.png?seed=1&w=2) and https://img.example/r.png?seed=1, done",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", PARITY_CORPUS)
+def test_single_pass_scan_matches_extract_then_remove(text):
+    url = extract_image_url(text)
+    expected = remove_image_references(text, url) if url else text
+
+    scan = scan_image_references(text)
+
+    assert scan.url == url
+    assert scan.text == expected
+
+
+@pytest.mark.parametrize("text", PARITY_CORPUS)
+def test_single_pass_scan_matches_removal_of_cut_url(text):
+    url = cut_image_url(extract_image_url(text))
+    expected = remove_image_references(text, url) if url else text
+
+    scan = scan_image_references(text, strip_query=True)
+
+    assert scan.url == url
+    assert scan.text == expected
+
+
+def test_extract_prefers_markdown_image_over_earlier_link():
+    text = "See https://example.com/page or ![pic](https://example.com/pic.png)."
+    assert extract_image_url(text) == "https://example.com/pic.png"
+
+
+def test_remove_image_references_strips_markdown_and_labels():
+    text = "Here it is. Image link: ![sunset](https://example.com/sunset.png) \n\n\n\nEnjoy!"
+    assert remove_image_references(text, "https://example.com/sunset.png") == "Here it is. \n\nEnjoy!"
+
+
+def test_fallback_prompt_prefers_explicit_prompt():
+    prompt = build_fallback_image_prompt("draw a dog", 'Image prompt: "a corgi surfing a wave"')
+    assert prompt == "a corgi surfing a wave"
+
+
+def test_fallback_prompt_strips_request_filler():
+    assert build_fallback_image_prompt("Can you please show me a picture of a red fox?", "") == "A red fox?"
+
+
+def test_fallback_prompt_is_memoised_on_the_normalised_text():
+    normalize_fallback_prompt.cache_clear()
+    build_fallback_image_prompt("draw a lighthouse", "")
+    build_fallback_image_prompt("draw a lighthouse", "A different reply every turn.")
+    info = normalize_fallback_prompt.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_should_request_fallback_image():
+    assert should_request_fallback_image("paint a boat", "", "A boat", "")
+    assert not should_request_fallback_image("paint a boat", "", "A boat", "https://example.com/boat.png")
+    assert not should_request_fallback_image("tell me a joke", "Knock knock.", "Tell me a joke", "")
+
+
+def test_pollinations_url_matches_browser_encoding():
+    url = build_pollinations_image_url(" 'a cat's hat' ", model="turbo", seed=5)
+    assert url == (
+        "https://image.pollinations.ai/prompt/a%20cat's%20hat"
+        "?model=turbo&width=1024&height=1024&nologo=true&enhance=true&seed=5"
+    )
+
+
+def test_process_reply_uses_response_image():
+    result = process_reply(
+        "show me a city",
+        "Here it is ![city](https://img.example/city.png?seed=3)",
+    )
+    assert result.image_url == "https://img.example/city.png"
+    assert result.text == "Here it is"
+    assert not result.used_fallback
+
+
+@pytest.mark.parametrize(
+    "message, text",
+    [
+        ("Image URL: https://image.pollinations.ai/prompt/forest?seed=42 enjoy it.", "enjoy it."),
+        ("See [the render](https://img.example/a.png?w=1&h=2), nice.", "See, nice."),
+        ("Here https://img.example/a.png?seed=1. Done.", "Here. Done."),
+    ],
+)
+def test_process_reply_removes_references_with_query_strings(message, text):
+    assert process_reply("hello", message).text == text
+
+
+def test_process_reply_requests_fallback_image():
+    result = process_reply("Please draw a castle", "A castle on a hill, coming up.", seed=1)
+    assert result.used_fallback
+    assert result.fallback_prompt == "A castle"
+    assert result.image_url.startswith("https://image.pollinations.ai/prompt/A%20castle?")
+    assert result.text == "A castle on a hill, coming up."
+
+
+def test_process_reply_without_image_keeps_text():
+    result = process_reply("How are you?", "Doing well.\n\n\n\nThanks!")
+    assert result.image_url == ""
+    assert result.text == "Doing well.\n\nThanks!"
+
+
+def test_benchmark_reports_cold_and_warm_passes_separately():
+    stats = benchmark(SAMPLE_REPLIES, repeat=3)
+    assert stats["replies"] == len(SAMPLE_REPLIES)
+    assert stats["cold_prompt_cache_misses"] > 0
+    assert stats["cold_replies_per_second"] > 0
+    assert stats["warm_replies_per_second"] > 0
+
+
+def test_benchmark_single_pass_is_cold_only():
+    stats = benchmark(SAMPLE_REPLIES)
+    assert "cold_microseconds_per_reply" in stats
+    assert not any(key.startswith("warm_") for key in stats)
+
+
+def test_benchmark_rejects_empty_corpus():
+    with pytest.raises(ValueError):
+        benchmark([], repeat=1)
@@ -0,0 +1,99 @@
+import pytest
+
+from playwright.sync_api import FakeVoiceLabApp, MutationRecord, sync_playwright
+
+
+def test_unmute_records_every_element_change():
+    app = FakeVoiceLabApp()
+    app.set_muted_state(False)
+
+    assert app.mutations.flush() == [
+        MutationRecord("user_circle", "class", "is-listening", False, True),
+        MutationRecord("mute_indicator", "attributes", "data-state", "muted", "listening"),
+        MutationRecord("indicator_text", "text", None, "Tap or click anywhere to unmute", "Listening… tap to mute"),
+    ]
+
+
+def test_changes_within_a_tick_are_coalesced():
+    app = FakeVoiceLabApp()
+    app.apply_theme("light")
+    app.apply_theme("dark")
+    app.apply_theme("light")
+
+    assert app.mutations.flush() == [MutationRecord("body", "attributes", "data-theme", "dark", "light")]
+
+
+def test_toggle_storm_back_to_start_delivers_nothing():
+    app = FakeVoiceLabApp()
+    deliveries = []
+    app.mutations.subscribe(deliveries.append)
+
+    for _ in range(50):
+        app.set_muted_state(False)
+        app.set_muted_state(True)
+    app.mutations.flush()
+
+    assert deliveries == []
+    assert app.mutations.tick == 1
+
+
+def test_subscribers_receive_one_batch_per_tick_until_unsubscribed():
+    app = FakeVoiceLabApp()
+    deliveries = []
+    unsubscribe = app.mutations.subscribe(deliveries.append)
+
+    app.set_muted_state(False)
+    app.mutations.flush()
+    app.apply_theme("light")
+    app.mutations.flush()
+    unsubscribe()
+    app.apply_theme("dark")
+    app.mutations.flush()
+
+    assert [len(batch) for batch in deliveries] == [3, 1]
+
+
+def test_take_records_clears_pending_without_delivery():
+    app = FakeVoiceLabApp()
+    deliveries = []
+    app.mutations.subscribe(deliveries.append)
+
+    app.apply_theme("light")
+    records = app.mutations.take_records()
+
+    assert [record.name for record in records] == ["data-theme"]
+    assert app.mutations.flush() == []
+    assert deliveries == []
+
+
+def test_page_delivers_mutations_after_each_evaluate():
+    with sync_playwright() as playwright:
+        page = playwright.chromium.launch().new_context().new_page()
+        page.goto("http://localhost/")
+        deliveries = []
+        page._app.mutations.subscribe(deliveries.append)
+
+        page.dispatch_event("body", "click")
+        page.evaluate("(async () => { await setMutedState(true); await setMutedState(false); })()")
+        page.evaluate("applyTheme('light')")
+
+    assert [[record.target for record in batch] for batch in deliveries] == [
+        ["user_circle", "mute_indicator", "indicator_text"],
+        ["body"],
+    ]
+
+
+def test_failed_evaluate_raises_its_own_error_and_keeps_pending_changes():
+    with sync_playwright() as playwright:
+        page = playwright.chromium.launch().new_context().new_page()
+        page.goto("http://localhost/")
+
+        def fail(records):
+            raise RuntimeError("subscriber failed")
+
+        page._app.mutations.subscribe(fail)
+        page._app.apply_theme("light")
+
+        with pytest.raises(NotImplementedError):
+            page.evaluate("unknownFunction()")
+        assert [record.name for record in page._app.mutations.take_records()] == ["data-theme"]
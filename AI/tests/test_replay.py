@@ -0,0 +1,210 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from playwright.__main__ import main as cli_main
+from playwright.replay import FAILED_REPLY, LocalChatCompletions, ReplayPipeline, STAGES, format_report, replay
+from playwright.sync_api import FakeVoiceLabApp
+
+
+def _lines(*records):
+    return [json.dumps(record) + "\n" for record in records]
+
+
+def test_replay_runs_each_turn_through_every_stage():
+    app = FakeVoiceLabApp()
+    pipeline = ReplayPipeline(app, queue_size=2)
+    turns = list(
+        pipeline.run(
+            _lines(
+                {"transcript": "unmute"},
+                {"transcript": "What's up?", "reply": "Not much. command: theme_light"},
+                {"transcript": "draw a cat", "reply": "Here ![cat](https://img.example/cat.png) enjoy!"},
+                "tell me a joke",
+            )
+        )
+    )
+
+    assert [turn.index for turn in turns] == [0, 1, 2, 3]
+    assert all(turn.error is None for turn in turns)
+    assert turns[0].spoken == ["Microphone unmuted."]
+    assert turns[1].spoken == ["Light theme activated.", "Not much."]
+    assert turns[2].image.image_url == "https://img.example/cat.png"
+    assert turns[2].spoken == ["Here enjoy!"]
+    assert turns[3].spoken == ["You said: tell me a joke. Tell me more about that."]
+    assert app.current_theme == "light"
+    assert not app.is_muted
+    for name in ("read", "command", "speak"):
+        assert pipeline.stats[name].items == 4
+    for name in ("completion", "directives", "image", "sanitize"):
+        assert (pipeline.stats[name].items, pipeline.stats[name].skipped) == (3, 1)
+    assert pipeline.bottleneck() is not None
+
+
+def test_stage_timings_cover_only_turns_the_stage_worked_on():
+    completions = LocalChatCompletions(delay=0.005)
+    pipeline = ReplayPipeline(FakeVoiceLabApp(), completions=completions)
+    records = [{"transcript": "unmute" if i % 2 else f"question {i}"} for i in range(20)]
+    list(pipeline.run(_lines(*records)))
+
+    completion = pipeline.stats["completion"]
+    assert completion.items == completions.requests == 10
+    assert completion.skipped == 10
+    assert completion.percentile_ms(50) >= 5
+    assert completion.throughput <= 200
+
+
+def test_history_keeps_the_final_assistant_message():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    reply = "Here ![cat](https://img.example/cat.png) enjoy! command: theme_dark"
+    records = (
+        {"transcript": "draw a cat", "reply": reply},
+        {"transcript": "hi", "reply": "![x](https://img.example/x.png)"},
+    )
+    list(pipeline.run(_lines(*records)))
+    assert [entry["content"] for entry in pipeline._history] == ["draw a cat", "Here enjoy!", "hi", "[image]"]
+
+
+def test_failed_turns_speak_the_apology():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    (turn,) = pipeline.run(_lines({"transcript": "hello", "reply": ""}))
+    assert turn.error.startswith("completion:")
+    assert turn.spoken == [FAILED_REPLY]
+
+
+def test_voice_commands_skip_the_completion_call():
+    completions = LocalChatCompletions()
+    pipeline = ReplayPipeline(FakeVoiceLabApp(), completions=completions)
+    list(pipeline.run(_lines({"transcript": "mute my mic"}, {"transcript": "dark mode"})))
+    assert completions.requests == 0
+
+
+def test_voice_commands_speak_their_announcement():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    turns = list(pipeline.run(_lines({"transcript": "switch to turbo"}, {"transcript": "clear history"})))
+    assert [turn.spoken for turn in turns] == [["Image model set to turbo."], ["Chat history cleared."]]
+
+
+def test_stop_directive_suppresses_speech():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    (turn,) = pipeline.run(_lines({"transcript": "hi", "reply": "Quiet now. command: shutup"}))
+    assert turn.spoken == []
+
+
+def test_invalid_lines_are_reported_on_the_turn():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    turns = list(pipeline.run(["not json\n", "\n", json.dumps("hello") + "\n"]))
+    assert turns[0].error.startswith("read:")
+    assert turns[1].error is None
+    assert pipeline.stats["read"].errors == 1
+    assert (pipeline.stats["speak"].items, pipeline.stats["speak"].skipped) == (1, 1)
+    assert pipeline.turn_latencies.seen == 1
+
+
+def test_undecodable_line_fails_on_its_own():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    lines = [b'{"transcript": "hello"}\n', b'{"transcript": "caf\xe9"}\n', b'"bye"\n']
+    turns = list(pipeline.run(lines))
+    assert [turn.error is None for turn in turns] == [True, False, True]
+    assert turns[1].error.startswith("read:")
+
+
+def test_reader_failure_is_raised_after_turns_read_so_far():
+    def lines():
+        yield json.dumps("hello") + "\n"
+        raise OSError("disk went away")
+
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    turns = pipeline.run(lines())
+    assert next(turns).transcript == "hello"
+    with pytest.raises(OSError, match="disk went away"):
+        next(turns)
+
+
+def test_replay_returns_non_zero_when_reading_fails(capsys):
+    def lines():
+        yield json.dumps("hello") + "\n"
+        raise OSError("disk went away")
+
+    output = io.StringIO()
+    assert replay(lines(), output=output) == 1
+    assert "turns: 1  errors: 0" in output.getvalue()
+    assert "disk went away" in capsys.readouterr().err
+
+
+def test_queue_depth_ignores_the_end_marker():
+    pipeline = ReplayPipeline(FakeVoiceLabApp(), queue_size=8)
+    list(pipeline.run(_lines(*({"transcript": f"line {i}"} for i in range(3)))))
+    assert all(pipeline.stats[name].queue_depth_max <= 3 for name in STAGES)
+
+
+def test_bounded_queues_apply_backpressure():
+    pipeline = ReplayPipeline(FakeVoiceLabApp(), completions=LocalChatCompletions(delay=0.002), queue_size=3)
+    list(pipeline.run(_lines(*({"transcript": f"question {i}"} for i in range(30)))))
+    assert pipeline.stats["command"].queue_depth_max <= 3
+    assert pipeline.stats["completion"].queue_depth_max == 3
+    assert pipeline.bottleneck().name == "completion"
+
+
+def test_closing_the_generator_stops_the_stages():
+    pipeline = ReplayPipeline(FakeVoiceLabApp(), queue_size=1)
+    turns = pipeline.run(_lines(*({"transcript": f"line {i}"} for i in range(100))))
+    next(turns)
+    turns.close()
+    assert pipeline.stats["read"].items < 100
+
+
+def test_closing_does_not_wait_for_a_blocked_reader():
+    release = threading.Event()
+
+    def lines():
+        yield json.dumps("hello") + "\n"
+        release.wait(5)
+
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    turns = pipeline.run(lines())
+    next(turns)
+    started = time.perf_counter()
+    turns.close()
+    release.set()
+    assert time.perf_counter() - started < 2
+
+
+def test_queue_size_must_be_positive():
+    with pytest.raises(ValueError):
+        ReplayPipeline(FakeVoiceLabApp(), queue_size=0)
+
+
+def test_report_lists_every_stage():
+    pipeline = ReplayPipeline(FakeVoiceLabApp())
+    list(pipeline.run(_lines({"transcript": "hello"})))
+    report = format_report(pipeline, turns=1, errors=0)
+    for name in STAGES:
+        assert name in report
+    assert "turn latency ms" in report
+
+
+def test_cli_replays_transcript_file(tmp_path, monkeypatch, capsys):
+    transcripts = tmp_path / "transcripts.jsonl"
+    transcripts.write_bytes(
+        b"".join(line.encode() for line in _lines({"transcript": "hello"}, {"transcript": "light mode"}))
+        + b'{"transcript": "\xff"}\n'
+    )
+    monkeypatch.setattr("sys.argv", ["playwright", "replay", str(transcripts), "--queue-size", "4"])
+
+    assert cli_main() == 0
+    output = capsys.readouterr().out
+    assert "turns: 3  errors: 1" in output
+    assert "bottleneck:" in output
+
+
+def test_cli_reports_missing_transcript_file(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["playwright", "replay", str(tmp_path / "missing.jsonl")])
+
+    with pytest.raises(SystemExit) as excinfo:
+        cli_main()
+    assert excinfo.value.code == 2
+    assert "cannot open transcripts" in capsys.readouterr().err
@@ -0,0 +1,51 @@
+import pytest
+
+from playwright.speech import match_voice_command, parse_ai_directives, sanitize_for_speech
+
+
+@pytest.mark.parametrize(
+    "transcript, action",
+    [
+        ("Please mute my mic", "mute_microphone"),
+        ("unmute", "unmute_microphone"),
+        ("switch to dark mode", "theme_dark"),
+        ("Switch to light", "switch_theme_light"),
+        ("use turbo model", "set_model_turbo"),
+        ("clear chat history", "clear_chat_history"),
+    ],
+)
+def test_voice_commands_follow_handle_voice_command_order(transcript, action):
+    command = match_voice_command(transcript)
+    assert command is not None
+    assert command.action == action
+
+
+def test_unrecognised_transcript_goes_to_the_ai():
+    assert match_voice_command("tell me about the moon") is None
+
+
+def test_parse_ai_directives_collects_unique_commands():
+    directives = parse_ai_directives(
+        "Done {command: mute_microphone} and [command: Theme Dark] /theme_dark.\ncommand: theme_dark"
+    )
+    assert directives.commands == ["theme_dark", "mute_microphone"]
+    assert "command" not in directives.cleaned_text.lower()
+
+
+def test_parse_ai_directives_reads_command_blocks():
+    directives = parse_ai_directives("Sure.\nActions\ntheme_light\nsave_image()")
+    assert directives.commands == ["theme_light", "save_image"]
+    assert directives.cleaned_text == "Sure."
+
+
+@pytest.mark.parametrize(
+    "text, spoken",
+    [
+        ("Here is the pic https://image.pollinations.ai/prompt/cat?seed=1 enjoy.", "Here is the pic enjoy."),
+        ("Visit www.example.com or example.org/path for more, okay?", "Visit or for more, okay?"),
+        ("Look at [the docs](https://example.com/docs) today.", "Look at the docs today."),
+        ("Image link: something here\nNext line stays.", "Next line stays."),
+    ],
+)
+def test_sanitize_for_speech_strips_urls_and_labels(text, spoken):
+    assert sanitize_for_speech(text) == spoken